@@ -8,12 +8,22 @@ import sys
 import time
 from functools import partial
 
+import orjson
 import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
 from tqdm.contrib.concurrent import thread_map
+from urllib3.util.retry import Retry
 
 # Configurations
 BASE_URL = "https://api.github.com/search/repositories"
+GRAPHQL_URL = "https://api.github.com/graphql"
 MAX_REPOS_PER_QUERY = 1000  # GitHub's API limit
+GRAPHQL_BATCH_SIZE = 100  # Repositories checked per GraphQL query
+CACHE_NAME = ".gh_cache"  # SQLite HTTP cache shared across runs
+CACHE_EXPIRE_AFTER = 3600  # Seconds before a cached response is revalidated
+REQUEST_TIMEOUT = 10  # Seconds, for REST requests
+GRAPHQL_TIMEOUT = 60  # Seconds, a 100-repository query can take a while
 
 # Base query parts
 BASE_QUERY = "language:C++ language:C fork:false"
@@ -32,21 +42,74 @@ STAR_RANGES = [
 ]
 
 
-def safe_request(url, headers, params=None, json_data=None, max_retries=3):
+def is_cacheable(response):
+    """Keep rate-limit and GraphQL error responses out of the cache.
+
+    GraphQL reports failures such as timeouts with a 200 status and an
+    "errors" key, which would otherwise be replayed until the entry expires.
+    NOT_FOUND errors for deleted or renamed repositories are a valid answer,
+    so those responses are still cached.
+    """
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return False
+    if response.request.method == "POST":
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        if body.get("data") is None:
+            return False
+        return all(e.get("type") == "NOT_FOUND" for e in body.get("errors") or [])
+    return True
+
+
+def create_session(headers):
+    """Create an HTTP session backed by a persistent on-disk cache.
+
+    Expired entries are revalidated with If-None-Match using the stored ETag,
+    and a 304 reply is served from the cache without counting against the
+    rate limit. GraphQL POSTs are cached by request body. Connections are
+    kept alive and pooled across all worker threads.
+    """
+    session = requests_cache.CachedSession(
+        cache_name=CACHE_NAME,
+        backend="sqlite",
+        expire_after=CACHE_EXPIRE_AFTER,
+        allowable_methods=("GET", "POST"),
+        filter_fn=is_cacheable,
+    )
+    retry = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=64, pool_maxsize=64, max_retries=retry)
+    session.mount("https://", adapter)
+    session.headers.update(headers)
+    return session
+
+
+def safe_request(session, url, params=None, json_data=None, max_retries=3):
     """A request function with rate-limit handling and retries."""
     for _ in range(max_retries):
         try:
             if json_data:
-                response = requests.post(
-                    url, json=json_data, headers=headers, timeout=10
-                )
+                response = session.post(url, json=json_data, timeout=GRAPHQL_TIMEOUT)
             else:
-                response = requests.get(url, headers=headers, params=params, timeout=10)
+                response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
 
-            if response.status_code == 200 or response.status_code == 404:
+            if getattr(response, "from_cache", False):
                 return response
 
-            if response.status_code == 403 and "rate limit" in response.text.lower():
+            # GraphQL reports an exhausted quota with a 200 status, so the
+            # remaining-quota header is checked alongside a 403.
+            quota_exhausted = response.status_code == 403 or (
+                json_data is not None
+                and response.headers.get("X-RateLimit-Remaining") == "0"
+            )
+            if quota_exhausted and "rate limit" in response.text.lower():
                 reset_time = int(
                     response.headers.get("X-RateLimit-Reset", time.time() + 60)
                 )
@@ -55,6 +118,9 @@ def safe_request(url, headers, params=None, json_data=None, max_retries=3):
                 time.sleep(sleep_time)
                 continue
 
+            if response.status_code == 200 or response.status_code == 404:
+                return response
+
             print(f"Request failed: {response.status_code} - {response.text}")
             time.sleep(2)
 
@@ -65,8 +131,13 @@ def safe_request(url, headers, params=None, json_data=None, max_retries=3):
     return None
 
 
-def fetch_repos_for_query(query, headers):
-    """Fetch up to 1000 repositories for a single specific query."""
+def fetch_repos_for_query(session, query):
+    """Fetch up to 1000 repositories for a single specific query.
+
+    Returns None if a page could not be fetched. Every page fetched so far is
+    kept in the HTTP cache, so a rerun replays them without API calls and
+    resumes at the first missing page.
+    """
     repositories = []
     params = {
         "q": query,
@@ -77,9 +148,9 @@ def fetch_repos_for_query(query, headers):
     }
 
     while len(repositories) < MAX_REPOS_PER_QUERY:
-        response = safe_request(BASE_URL, headers, params=params)
+        response = safe_request(session, BASE_URL, params=params)
         if not response:
-            break
+            return None
 
         data = response.json()
         items = data.get("items", [])
@@ -108,35 +179,58 @@ def fetch_repos_for_query(query, headers):
     return repositories
 
 
-def process_repository(repo, headers):
-    """Process a single repository to check for CMakeLists.txt."""
-    cmake_url = (
-        f"https://api.github.com/repos/{repo['full_name']}/contents/CMakeLists.txt"
-    )
-    # Use a HEAD request for efficiency as we only need the status code
-    response = safe_request(cmake_url, headers)
-    has_cmake = response.status_code == 200 if response else False
-
-    # # Get language information (secondary verification)
-    # lang_response = safe_request(repo["languages_url"], headers)
-    # languages = lang_response.json().keys() if lang_response else []
-
-    # # Get the commit id of the default branch
-    # commit_url = f"https://api.github.com/repos/{repo['full_name']}/commits/{repo['default_branch']}"
-    # commit_response = safe_request(commit_url, headers)
-    # commit_id = None
-    # if commit_response and commit_response.status_code == 200:
-    #     commit_data = commit_response.json()
-    #     commit_id = commit_data.get("sha")
-
-    return {
-        **repo,
-        # "commit_id": commit_id,
-        "has_cmake": has_cmake,
-        # "languages": list(languages),
-        # "is_valid": has_cmake and ("C" in languages or "C++" in languages),
+def build_cmake_query(repos):
+    """Build a GraphQL query checking each repository for a CMakeLists.txt."""
+    fields = []
+    for i, repo in enumerate(repos):
+        owner, name = repo["full_name"].split("/", 1)
+        fields.append(
+            f"repo{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) "
+            '{ object(expression: "HEAD:CMakeLists.txt") { __typename } }'
+        )
+    return "query {\n" + "\n".join(fields) + "\n}"
+
+
+def process_repositories_batch(session, repos):
+    """Check a batch of repositories for CMakeLists.txt with one GraphQL query.
+
+    Returns None if the batch could not be checked, so that its repositories
+    are not mistaken for ones without a CMakeLists.txt.
+    """
+    query = build_cmake_query(repos)
+    response = safe_request(session, GRAPHQL_URL, json_data={"query": query})
+    if not response or response.status_code != 200:
+        print(f"GraphQL batch at {repos[0]['full_name']} failed.")
+        return None
+
+    body = response.json()
+    data = body.get("data")
+    errors = body.get("errors") or []
+    if data is None:
+        messages = "; ".join(e.get("message", "") for e in errors)
+        print(f"GraphQL batch at {repos[0]['full_name']} failed: {messages}")
+        return None
+
+    # Repositories that no longer exist come back as null with a NOT_FOUND
+    # error for their alias; any other null means the lookup itself failed.
+    not_found = {
+        e["path"][0]
+        for e in errors
+        if e.get("type") == "NOT_FOUND" and e.get("path")
     }
 
+    results = []
+    for i, repo in enumerate(repos):
+        alias = f"repo{i}"
+        repo_data = data.get(alias)
+        if repo_data is None and alias not in not_found:
+            print(f"GraphQL lookup of {repo['full_name']} failed.")
+            return None
+        obj = (repo_data or {}).get("object")
+        has_cmake = obj is not None and obj["__typename"] == "Blob"
+        results.append({**repo, "has_cmake": has_cmake})
+    return results
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -153,8 +247,8 @@ def main():
         "-w",
         "--max-workers",
         type=int,
-        default=20,
-        help="Number of concurrent threads (default: 20)",
+        default=4,
+        help="Number of concurrent GraphQL batch requests (default: 4)",
     )
     parser.add_argument(
         "-o",
@@ -175,6 +269,8 @@ def main():
         "Accept": "application/vnd.github.v3+json",
     }
 
+    session = create_session(headers)
+
     all_repositories = []
     print("Fetching repository list by slicing star counts...")
 
@@ -182,7 +278,14 @@ def main():
     for s_range in STAR_RANGES:
         query = f"{BASE_QUERY} stars:{s_range}"
         print(f"\nExecuting query: '{query}'")
-        repos_for_range = fetch_repos_for_query(query, headers)
+        repos_for_range = fetch_repos_for_query(session, query)
+        if repos_for_range is None:
+            print(
+                "❌ Error: Could not fetch all search pages. Re-run to resume; "
+                "pages fetched so far are cached.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
         all_repositories.extend(repos_for_range)
         print(f"Found {len(repos_for_range)} repositories in this range.")
 
@@ -200,26 +303,50 @@ def main():
     # Process all unique repositories in parallel
     print("Processing repositories to check for CMakeLists.txt...")
 
-    process_func = partial(process_repository, headers=headers)
-    results = list(
+    batches = [
+        unique_repositories[i : i + GRAPHQL_BATCH_SIZE]
+        for i in range(0, len(unique_repositories), GRAPHQL_BATCH_SIZE)
+    ]
+    process_func = partial(process_repositories_batch, session)
+    batch_results = list(
         thread_map(
             process_func,
-            unique_repositories,
+            batches,
             max_workers=args.max_workers,
             desc="Processing repos",
-            unit="repo",
+            unit="batch",
         )
     )
 
+    # Give failed batches one more try before giving up
+    failed = []
+    for i, batch in enumerate(batches):
+        if batch_results[i] is None:
+            batch_results[i] = process_func(batch)
+            if batch_results[i] is None:
+                failed.extend(repo["full_name"] for repo in batch)
+
+    if failed:
+        print(
+            "❌ Error: Could not check these repositories for CMakeLists.txt:",
+            file=sys.stderr,
+        )
+        for full_name in failed:
+            print(f"  {full_name}", file=sys.stderr)
+        print("Re-run to resume; batches checked so far are cached.", file=sys.stderr)
+        sys.exit(1)
+
+    results = [repo for batch in batch_results for repo in batch]
+
     valid_repos = [r for r in results if r["has_cmake"]]
     excluded_repos = [r for r in results if not r["has_cmake"]]
 
     # Save the results
-    with open(os.path.join(output_dir, "cmake_repos.json"), "w") as f:
-        json.dump(valid_repos, f, indent=2)
+    with open(os.path.join(output_dir, "cmake_repos.json"), "wb") as f:
+        f.write(orjson.dumps(valid_repos, option=orjson.OPT_INDENT_2))
 
-    with open(os.path.join(output_dir, "excluded_repos.json"), "w") as f:
-        json.dump(excluded_repos, f, indent=2)
+    with open(os.path.join(output_dir, "excluded_repos.json"), "wb") as f:
+        f.write(orjson.dumps(excluded_repos, option=orjson.OPT_INDENT_2))
 
     print("\n--- Results ---")
     print(f"Repositories with CMakeLists.txt: {len(valid_repos)}")
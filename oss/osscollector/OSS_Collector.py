@@ -7,6 +7,8 @@ Modified: 	December 16, 2020.
 import os
 import subprocess
 import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import tlsh  # Please intall python-tlsh
 
 """GLOBALS"""
@@ -20,25 +22,31 @@ ctagsPath = (
     "/usr/local/bin/ctags"  # Ctags binary path (please specify your own ctags path)
 )
 
+# Code for removing C/C++ style comments. (Imported from VUDDY and ReDeBug.)
+# ref: https://github.com/squizz617/vuddy
+commentRegex = re.compile(
+    r'(?P<comment>//.*?$|[{}]+)|(?P<multilinecomment>/\*.*?\*/)|(?P<noncomment>\'(\\.|[^\\\'])*\'|"(\\.|[^\\"])*"|.[^/\'"]*)',
+    re.DOTALL | re.MULTILINE,
+)
+# For parsing ctags output and function bodies
+funcRegex = re.compile(r"(function)")
+numberRegex = re.compile(r"(\d+)")
+funcSearchRegex = re.compile(r"{([\S\s]*)}")
+spaceRegex = re.compile(r"\s{2,}")
+# Characters dropped by normalize()
+normTable = str.maketrans("", "", "\n\r\t{} ")
+
 
 # Generate TLSH
-def computeTlsh(string):
-    string = str.encode(string)
-    hs = tlsh.forcehash(string)
-    return hs
+def computeTlsh(body):
+    return tlsh.forcehash(body)
 
 
 def removeComment(string):
-    # Code for removing C/C++ style comments. (Imported from VUDDY and ReDeBug.)
-    # ref: https://github.com/squizz617/vuddy
-    c_regex = re.compile(
-        r'(?P<comment>//.*?$|[{}]+)|(?P<multilinecomment>/\*.*?\*/)|(?P<noncomment>\'(\\.|[^\\\'])*\'|"(\\.|[^\\"])*"|.[^/\'"]*)',
-        re.DOTALL | re.MULTILINE,
-    )
     return "".join(
         [
             c.group("noncomment")
-            for c in c_regex.finditer(string)
+            for c in commentRegex.finditer(string)
             if c.group("noncomment")
         ]
     )
@@ -48,20 +56,169 @@ def normalize(string):
     # Code for normalizing the input string.
     # LF and TAB literals, curly braces, and spaces are removed,
     # and all characters are lowercased.
+    # The result is UTF-8 bytes, ready to be passed to computeTlsh.
     # ref: https://github.com/squizz617/vuddy
-    return "".join(
-        string.replace("\n", "")
-        .replace("\r", "")
-        .replace("\t", "")
-        .replace("{", "")
-        .replace("}", "")
-        .split(" ")
-    ).lower()
+    return string.translate(normTable).lower().encode()
+
+
+def collectFunctionLines(repoPath, possible):
+    # Run ctags once over the whole repository and group the line ranges
+    # of every function by the (normalized) path of the file defining it.
+    functionList = subprocess.run(
+        [
+            ctagsPath,
+            "-R",
+            "-f",
+            "-",
+            "--kinds-C=*",
+            "--fields=neKSt",
+            "--languages=C,C++",
+            repoPath,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    ).stdout.decode(errors="ignore")
+
+    funcLines = {}
+
+    for i in functionList.split("\n"):
+        elemList = spaceRegex.sub("", i)
+        elemList = elemList.split("\t")
+
+        if i != "" and len(elemList) >= 8 and funcRegex.fullmatch(elemList[3]):
+            if not elemList[1].endswith(possible):
+                continue
+            funcStartLine = int(numberRegex.search(elemList[4]).group(0))
+            funcEndLine = int(numberRegex.search(elemList[7]).group(0))
+            filePath = os.path.normpath(elemList[1])
+            if filePath not in funcLines:
+                funcLines[filePath] = []
+            funcLines[filePath].append((funcStartLine, funcEndLine))
+
+    return funcLines
+
+
+def readFunctions(f, funcLines):
+    # Read the source of each (start, end) line range in one pass over the
+    # file, keeping only lines inside some range instead of the whole file.
+    # Returns the function sources (in funcLines order) and the line count.
+    order = sorted(range(len(funcLines)), key=lambda k: funcLines[k][0])
+    bodies = [[] for _ in funcLines]
+    active = []
+    nextFunc = 0
+    lineCnt = 0
+
+    for lineCnt, line in enumerate(f, 1):
+        while nextFunc < len(order) and funcLines[order[nextFunc]][0] <= lineCnt:
+            k = order[nextFunc]
+            if funcLines[k][1] >= lineCnt:
+                active.append(k)
+            nextFunc += 1
+        if active:
+            for k in active:
+                bodies[k].append(line)
+            active = [k for k in active if funcLines[k][1] > lineCnt]
+
+    return ["".join(body) for body in bodies], lineCnt
+
+
+def hashFile(filePath, funcLines):
+    # Hash every function of a single file given its ctags line ranges.
+    # Runs in a worker process, so it only depends on its arguments.
+    # The result does not depend on where the file lives, so it can be
+    # reused for every revision containing the same blob.
+    funcs = []
+
+    try:
+        with open(filePath, "r", encoding="UTF-8") as f:
+            funcSources, fileLineCnt = readFunctions(f, funcLines)
+
+        for (funcStartLine, funcEndLine), tmpString in zip(funcLines, funcSources):
+            funcBody = ""
+
+            funcMatch = funcSearchRegex.search(tmpString)
+            if funcMatch:
+                funcBody = funcBody + funcMatch.group(1)
+            else:
+                funcBody = " "
+
+            funcBody = removeComment(funcBody)
+            funcBody = normalize(funcBody)
+            funcHash = computeTlsh(funcBody)
+
+            if len(funcHash) == 72 and funcHash.startswith("T1"):
+                funcHash = funcHash[2:]
+            elif funcHash == "TNULL" or funcHash == "" or funcHash == "NULL":
+                continue
+
+            funcs.append((funcHash, funcStartLine, funcEndLine))
+
+    except Exception as e:
+        print("Hashing failed", e)
+        return None
+
+    return funcs, fileLineCnt
+
+
+def listSources(repoPath, revision, possible):
+    # List (blob sha, path) of every C/C++ file in a revision, straight
+    # from the object database, so no worktree checkout is needed.
+    treeResult = subprocess.check_output(
+        ["git", "ls-tree", "-r", "-z", revision],
+        cwd=repoPath,
+        stderr=subprocess.DEVNULL,
+    )
+
+    sources = []
+    for entry in treeResult.split(b"\0"):
+        if not entry:
+            continue
+        meta, path = entry.split(b"\t", 1)
+        mode, objType, sha = meta.split()
+        # Symlinks and submodules carry no source of their own
+        if objType != b"blob" or mode == b"120000":
+            continue
+        path = os.fsdecode(path)
+        if path.endswith(possible):
+            sources.append((sha.decode(), path))
+
+    return sources
 
 
-def hashing(repoPath):
+def writeBlobs(repoPath, blobs, outDir):
+    # Stream blob contents out of a single `git cat-file --batch` process
+    # and write each one to outDir under its given file name.
+    proc = subprocess.Popen(
+        ["git", "cat-file", "--batch"],
+        cwd=repoPath,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    try:
+        for sha, fileName in blobs:
+            proc.stdin.write(sha.encode() + b"\n")
+            proc.stdin.flush()
+
+            header = proc.stdout.readline().split()
+            if len(header) != 3:
+                raise RuntimeError("git cat-file failed for " + sha)
+            data = proc.stdout.read(int(header[2]))
+            proc.stdout.read(1)  # Trailing newline after each object
+
+            with open(os.path.join(outDir, fileName), "wb") as f:
+                f.write(data)
+    finally:
+        proc.stdin.close()
+        proc.stdout.close()
+        proc.wait()
+
+
+def hashing(repoPath, revision, blobCache):
     # This function is for hashing C/C++ functions
     # Only consider ".c", ".cc", and ".cpp" files
+    # blobCache maps (blob sha, extension) to hashFile() results and is shared
+    # across the revisions of a repository, so unchanged files are hashed once
     possible = (".c", ".cc", ".cpp")
 
     fileCnt = 0
@@ -70,98 +227,58 @@ def hashing(repoPath):
 
     resDict = {}
 
-    for path, dir, files in os.walk(repoPath):
-        for file in files:
-            filePath = os.path.join(path, file)
-
-            if file.endswith(possible):
-                try:
-                    # Execute Ctgas command
-                    functionList = subprocess.check_output(
-                        ctagsPath
-                        + ' -f - --kinds-C=* --fields=neKSt "'
-                        + filePath
-                        + '"',
-                        stderr=subprocess.STDOUT,
-                        shell=True,
-                    ).decode()
-
-                    f = open(filePath, "r", encoding="UTF-8")
-
-                    # For parsing functions
-                    lines = f.readlines()
-                    allFuncs = str(functionList).split("\n")
-                    func = re.compile(r"(function)")
-                    number = re.compile(r"(\d+)")
-                    funcSearch = re.compile(r"{([\S\s]*)}")
-                    tmpString = ""
-                    funcBody = ""
-
-                    fileCnt += 1
-
-                    for i in allFuncs:
-                        elemList = re.sub(r"[\t\s ]{2,}", "", i)
-                        elemList = elemList.split("\t")
-                        funcBody = ""
-
-                        if (
-                            i != ""
-                            and len(elemList) >= 8
-                            and func.fullmatch(elemList[3])
-                        ):
-                            funcStartLine = int(number.search(elemList[4]).group(0))
-                            funcEndLine = int(number.search(elemList[7]).group(0))
-
-                            tmpString = ""
-                            tmpString = tmpString.join(
-                                lines[funcStartLine - 1 : funcEndLine]
-                            )
+    sources = listSources(repoPath, revision, possible)
 
-                            if funcSearch.search(tmpString):
-                                funcBody = funcBody + funcSearch.search(
-                                    tmpString
-                                ).group(1)
-                            else:
-                                funcBody = " "
-
-                            funcBody = removeComment(funcBody)
-                            funcBody = normalize(funcBody)
-                            funcHash = computeTlsh(funcBody)
-
-                            if len(funcHash) == 72 and funcHash.startswith("T1"):
-                                funcHash = funcHash[2:]
-                            elif (
-                                funcHash == "TNULL"
-                                or funcHash == ""
-                                or funcHash == "NULL"
-                            ):
-                                continue
-
-                            storedPath = filePath.replace(repoPath, "")
-                            if funcHash not in resDict:
-                                resDict[funcHash] = []
-                            resDict[funcHash].append(storedPath)
-
-                            lineCnt += len(lines)
-                            funcCnt += 1
-
-                            print(
-                                "[.] Hashing",
-                                filePath,
-                                ":",
-                                funcHash,
-                                "at",
-                                funcStartLine,
-                                "~",
-                                funcEndLine,
-                            )
+    newBlobs = {}
+    for sha, path in sources:
+        key = (sha, os.path.splitext(path)[1])
+        if key not in blobCache:
+            # The extension is kept so ctags picks the same language
+            newBlobs[key] = sha + key[1]
 
-                except subprocess.CalledProcessError as e:
-                    print("Parser Error:", e)
-                    continue
-                except Exception as e:
-                    print("Subprocess failed", e)
-                    continue
+    if newBlobs:
+        with tempfile.TemporaryDirectory() as blobDir:
+            writeBlobs(repoPath, [(k[0], n) for k, n in newBlobs.items()], blobDir)
+
+            try:
+                # Execute Ctags command
+                allFuncLines = collectFunctionLines(blobDir, possible)
+            except subprocess.CalledProcessError as e:
+                print("Parser Error:", e)
+                return resDict, fileCnt, funcCnt, lineCnt
+
+            filePaths = [os.path.join(blobDir, n) for n in newBlobs.values()]
+            funcLines = [allFuncLines.get(os.path.normpath(p), []) for p in filePaths]
+
+            # Each file is hashed independently, so spread them across processes
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                results = executor.map(hashFile, filePaths, funcLines, chunksize=16)
+                for key, result in zip(newBlobs, results):
+                    blobCache[key] = result
+
+    for sha, path in sources:
+        result = blobCache[(sha, os.path.splitext(path)[1])]
+        if result is None:
+            continue
+        funcs, fileLineCnt = result
+        storedPath = "/" + path
+
+        for funcHash, funcStartLine, funcEndLine in funcs:
+            resDict.setdefault(funcHash, []).append(storedPath)
+            print(
+                "[.] Hashing",
+                storedPath,
+                ":",
+                funcHash,
+                "at",
+                funcStartLine,
+                "~",
+                funcEndLine,
+            )
+
+        fileCnt += 1
+        funcCnt += len(funcs)
+        lineCnt += fileLineCnt * len(funcs)
 
     return resDict, fileCnt, funcCnt, lineCnt
 
@@ -198,35 +315,44 @@ def main():
             print("[+] Processing", repoName)
 
             try:
-                cloneCommand = eachUrl + " " + clonePath + repoName
+                cloneCommand = eachUrl.split() + [clonePath + repoName]
                 cloneResult = subprocess.check_output(
-                    cloneCommand, stderr=subprocess.STDOUT, shell=True
+                    cloneCommand, stderr=subprocess.STDOUT
                 ).decode()
 
                 os.chdir(clonePath + repoName)
 
-                dateCommand = 'git log --tags --simplify-by-decoration --pretty="format:%ai %d"'  # For storing tag dates
+                dateCommand = [
+                    "git",
+                    "log",
+                    "--tags",
+                    "--simplify-by-decoration",
+                    "--pretty=format:%ai %d",
+                ]  # For storing tag dates
                 dateResult = subprocess.check_output(
-                    dateCommand, stderr=subprocess.STDOUT, shell=True
+                    dateCommand, stderr=subprocess.STDOUT
                 ).decode()
                 tagDateFile = open(tagDatePath + repoName, "w")
                 tagDateFile.write(str(dateResult))
                 tagDateFile.close()
 
-                tagCommand = "git tag"
+                tagCommand = ["git", "tag"]
                 tagResult = subprocess.check_output(
-                    tagCommand, stderr=subprocess.STDOUT, shell=True
+                    tagCommand, stderr=subprocess.STDOUT
                 ).decode()
 
                 resDict = {}
                 fileCnt = 0
                 funcCnt = 0
                 lineCnt = 0
+                blobCache = {}
 
                 if tagResult == "":
                     # No tags, only master repo
 
-                    resDict, fileCnt, funcCnt, lineCnt = hashing(clonePath + repoName)
+                    resDict, fileCnt, funcCnt, lineCnt = hashing(
+                        clonePath + repoName, "HEAD", blobCache
+                    )
                     if len(resDict) > 0:
                         if not os.path.isdir(resultPath + repoName):
                             os.mkdir(resultPath + repoName)
@@ -240,16 +366,13 @@ def main():
                         indexing(resDict, title, resultFilePath)
 
                 else:
-                    for tag in str(tagResult).split("\n"):
+                    for tag in tagResult.splitlines():
                         # Generate function hashes for each tag (version)
 
-                        checkoutCommand = subprocess.check_output(
-                            "git checkout -f " + tag,
-                            stderr=subprocess.STDOUT,
-                            shell=True,
-                        )
+                        # Read each tag from the object database instead of
+                        # checking it out, reusing hashes of unchanged blobs
                         resDict, fileCnt, funcCnt, lineCnt = hashing(
-                            clonePath + repoName
+                            clonePath + repoName, tag, blobCache
                         )
 
                         if len(resDict) > 0:
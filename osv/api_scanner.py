@@ -1,9 +1,15 @@
 import os
 import hashlib
 import base64
-import json
+import mmap
 import argparse
+import orjson
 import requests
+import xxhash
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, Optional, List
 
 VENDORED_LIB_NAMES = {
@@ -22,68 +28,199 @@ VENDORED_LIB_NAMES = {
 FILE_EXTS = (".hpp", ".h", ".hh", ".cc", ".c", ".cpp")
 MAX_DETERMINE_VERSION_FILES = 10000
 OSV_API_URL = "https://api.osv.dev/v1experimental/determineversion"
+MMAP_THRESHOLD = 1024 * 1024  # Hash larger files straight from an mmap
+HASH_WORKERS = (os.cpu_count() or 1) * 2
+OSV_CONCURRENCY = 16  # Maximum number of DetermineVersion requests in flight
 
 
-def query_determine_versions(
-    library_path: str, scan_git_dir: bool = False
-) -> Optional[Dict[str, Any]]:
+def _create_session() -> requests.Session:
     """
-    Core extraction logic: Scans a single library directory, hashes files,
-    and queries the OSV API.
+    Returns a session that keeps OSV connections alive across requests and
+    retries transient failures. DetermineVersion is a read-only query, so its
+    POSTs are safe to retry.
     """
-    print(f"\n[Extractor] Analyzing potential library at: {library_path}")
-    file_hashes = []
+    retry = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=OSV_CONCURRENCY, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
 
-    for root, dirs, files in os.walk(library_path, topdown=True):
-        dirs[:] = [
-            d
-            for d in dirs
-            if (scan_git_dir or d != ".git") and d.lower() not in VENDORED_LIB_NAMES
-        ]
 
-        for filename in files:
-            if not filename.endswith(FILE_EXTS):
-                continue
-
-            full_path = os.path.join(root, filename)
-            relative_path = os.path.relpath(full_path, library_path)
-
-            try:
-                with open(full_path, "rb") as f:
-                    content = f.read()
-                    md5_digest = hashlib.md5(content).digest()
-                    b64_hash = base64.b64encode(md5_digest)
-                    hash_str = b64_hash.decode("utf-8")
-
-                    file_hashes.append(
-                        {
-                            "file_path": relative_path.replace("\\", "/"),
-                            "hash": hash_str,
-                        }
+def _md5_b64(data, size: int, md5_cache: Optional[Dict[tuple, str]]) -> str:
+    """
+    Returns the base64-encoded MD5 of a buffer. With a cache, identical
+    contents (same size and XXH3 digest) are MD5-hashed only once.
+    """
+    if md5_cache is None:
+        return base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+    key = (size, xxhash.xxh3_64_intdigest(data))
+    hash_str = md5_cache.get(key)
+    if hash_str is None:
+        hash_str = base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+        md5_cache[key] = hash_str
+    return hash_str
+
+
+def _hash_file(
+    full_path: str, size: int, md5_cache: Optional[Dict[tuple, str]] = None
+) -> Optional[str]:
+    """
+    Returns the base64-encoded MD5 digest of a file, or None if it cannot be read.
+    hashlib releases the GIL while digesting, so this is safe to run in threads.
+    md5_cache is only passed for files whose size is shared with another file.
+    """
+    try:
+        with open(full_path, "rb") as f:
+            if size > MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return _md5_b64(mm, size, md5_cache)
+            if md5_cache is None and hasattr(hashlib, "file_digest"):  # 3.11+
+                md5_digest = hashlib.file_digest(f, "md5").digest()
+                return base64.b64encode(md5_digest).decode("ascii")
+            return _md5_b64(f.read(), size, md5_cache)
+    except (IOError, ValueError) as e:
+        print(f"  Warning: Could not read file {full_path}: {e}")
+        return None
+
+
+def _find_vendored_libraries(
+    project_root: str, scan_git: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Walks the project once and returns every vendored library (each
+    subdirectory of a vendor-named directory) along with its C/C++ files.
+    A file belongs to each enclosing library it can be reached from without
+    crossing .git or another vendor-named directory, exactly what a separate
+    walk from every library root would collect. Files are listed in top-down
+    order and capped at MAX_DETERMINE_VERSION_FILES per library.
+    """
+    libraries: List[Dict[str, Any]] = []
+    # (directory, libraries whose files include this directory,
+    #  whether to keep looking for vendor directories below it)
+    stack = [(project_root, [], True)]
+
+    while stack:
+        dir_path, covering, search = stack.pop()
+        is_vendor_dir = (
+            search and os.path.basename(dir_path).lower() in VENDORED_LIB_NAMES
+        )
+        if is_vendor_dir:
+            print(f"[Scanner] Found potential vendor directory: {dir_path}")
+
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue
+
+        children = []
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if not scan_git and name == ".git":
+                        continue
+                    child_covering = (
+                        [] if name.lower() in VENDORED_LIB_NAMES else covering
                     )
-            except IOError as e:
-                print(f"  Warning: Could not read file {full_path}: {e}")
-                continue
+                    if is_vendor_dir:
+                        library = _new_library(entry.path)
+                        libraries.append(library)
+                        child_covering = child_covering + [library]
+                    if search or child_covering:
+                        children.append((entry.path, child_covering, search))
+                elif is_vendor_dir and entry.is_dir():
+                    # A symlinked library is scanned, but not searched further
+                    library = _new_library(entry.path)
+                    libraries.append(library)
+                    children.append((entry.path, [library], False))
+                elif covering and name.endswith(FILE_EXTS):
+                    try:
+                        size = entry.stat().st_size
+                    except OSError:
+                        size = 0  # Reported when the file fails to open
+                    full_path = entry.path
+                    for library in covering:
+                        source_files = library["source_files"]
+                        # Check the cap before queuing, so nothing over the
+                        # limit is ever opened.
+                        if len(source_files) >= MAX_DETERMINE_VERSION_FILES:
+                            library["truncated"] = True
+                            continue
+                        relative_path = full_path[library["prefix_len"] :]
+                        source_files.append(
+                            (full_path, relative_path.replace("\\", "/"), size)
+                        )
 
-            if len(file_hashes) >= MAX_DETERMINE_VERSION_FILES:
-                print(
-                    f"  Warning: Reached file limit of {MAX_DETERMINE_VERSION_FILES}. Stopping hash collection."
-                )
-                break
+        # Visit children in listing order, like a top-down os.walk
+        stack.extend(reversed(children))
+
+    return libraries
+
+
+def _new_library(library_path: str) -> Dict[str, Any]:
+    return {
+        "library_path": library_path,
+        "prefix_len": len(os.path.join(library_path, "")),
+        "source_files": [],
+        "truncated": False,
+    }
 
-        if len(file_hashes) >= MAX_DETERMINE_VERSION_FILES:
-            break
+
+def collect_file_hashes(
+    library_path: str, source_files: List[tuple], truncated: bool = False
+) -> List[Dict[str, str]]:
+    """
+    Core extraction logic: Hashes the C/C++ files found for a single library
+    in the format expected by the DetermineVersion API.
+    """
+    print(f"\n[Extractor] Analyzing potential library at: {library_path}")
+    if truncated:
+        print(
+            f"  Warning: Reached file limit of {MAX_DETERMINE_VERSION_FILES}. Stopping hash collection."
+        )
+
+    # Vendored trees often carry identical copies of a file. Only files that
+    # share their size with another one can be duplicates, so just those go
+    # through the XXH3-keyed cache that lets copies reuse a computed MD5.
+    size_counts = Counter(size for _, _, size in source_files)
+    md5_cache: Dict[tuple, str] = {}
+
+    def hash_source(source_file):
+        full_path, _, size = source_file
+        shared = size_counts[size] > 1
+        return _hash_file(full_path, size, md5_cache if shared else None)
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        hashes = executor.map(hash_source, source_files)
+        file_hashes = [
+            {"file_path": relative_path, "hash": hash_str}
+            for (_, relative_path, _), hash_str in zip(source_files, hashes)
+            if hash_str is not None
+        ]
 
     print(f"  Found {len(file_hashes)} relevant C/C++ files to hash.")
-    if not file_hashes:
-        return None
+    return file_hashes
+
 
+def query_determine_versions(
+    session: requests.Session, library_path: str, file_hashes: List[Dict[str, str]]
+) -> Optional[Dict[str, Any]]:
+    """
+    Queries the OSV DetermineVersion API with the file hashes of a library.
+    """
     library_name = os.path.basename(os.path.normpath(library_path))
     payload = {"name": library_name, "file_hashes": file_hashes}
 
     print(f"  Sending request to OSV API for library '{library_name}'...")
     try:
-        response = requests.post(OSV_API_URL, json=payload, timeout=60)
+        response = session.post(OSV_API_URL, json=payload, timeout=60)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -101,53 +238,61 @@ def scan_project_for_vendored_libs(
     vendored libraries, saving confident matches to a list.
     """
     print(f"Starting scan for vendored libraries in: {project_root}")
-    found_any = False
     all_results: List[Dict[str, Any]] = []
 
-    for root, dirs, _ in os.walk(project_root, topdown=True):
-        parent_dir_name = os.path.basename(root).lower()
-        if parent_dir_name in VENDORED_LIB_NAMES:
-            print(f"[Scanner] Found potential vendor directory: {root}")
-            for lib_dir_name in dirs:
-                library_path = os.path.join(root, lib_dir_name)
-                if not os.path.isdir(library_path):
-                    continue
-
-                found_any = True
-                result = query_determine_versions(library_path, scan_git)
-
-                if not result or not result.get("matches"):
-                    print(
-                        "  -> No potential matches found by the OSV API for this library."
-                    )
-                    continue
-
-                best_match = result["matches"][0]
-                if best_match["score"] > threshold:
-                    repo_info = best_match.get("repo_info", {})
-                    # --- Console Logging (preserved) ---
-                    print("\n  --- ✅ Confident Match Found ---")
-                    print(f"  Library Path: {library_path}")
-                    print(
-                        f"  Score: {best_match['score']:.2f} (Threshold: {threshold})"
-                    )
-                    print(f"  Repository: {repo_info.get('address')}")
-                    print(
-                        f"  Version/Tag: {repo_info.get('version') or repo_info.get('tag')}"
-                    )
+    libraries = _find_vendored_libraries(project_root, scan_git)
+    found_any = bool(libraries)
 
-                    # --- Collect result for JSON output ---
-                    result_data = {
-                        "library_path": library_path,
-                        "score": best_match["score"],
-                        "repo_info": repo_info,
-                    }
-                    all_results.append(result_data)
-                else:
-                    print("\n  --- ❌ No confident match found ---")
-                    print(
-                        f"  Best match score was {best_match['score']:.2f}, below the threshold of {threshold}."
-                    )
+    # Libraries are hashed one after another while their OSV queries run
+    # concurrently in the background; results are reported in scan order.
+    session = _create_session()
+    pending = []
+
+    with ThreadPoolExecutor(max_workers=OSV_CONCURRENCY) as executor:
+        for library in libraries:
+            library_path = library["library_path"]
+            file_hashes = collect_file_hashes(
+                library_path, library["source_files"], library["truncated"]
+            )
+            future = None
+            if file_hashes:
+                future = executor.submit(
+                    query_determine_versions, session, library_path, file_hashes
+                )
+            pending.append((library_path, future))
+
+    for library_path, future in pending:
+        result = future.result() if future else None
+
+        if not result or not result.get("matches"):
+            print(
+                f"\n  -> No potential matches found by the OSV API for {library_path}."
+            )
+            continue
+
+        best_match = result["matches"][0]
+        if best_match["score"] > threshold:
+            repo_info = best_match.get("repo_info", {})
+            # --- Console Logging (preserved) ---
+            print("\n  --- ✅ Confident Match Found ---")
+            print(f"  Library Path: {library_path}")
+            print(f"  Score: {best_match['score']:.2f} (Threshold: {threshold})")
+            print(f"  Repository: {repo_info.get('address')}")
+            print(f"  Version/Tag: {repo_info.get('version') or repo_info.get('tag')}")
+
+            # --- Collect result for JSON output ---
+            result_data = {
+                "library_path": library_path,
+                "score": best_match["score"],
+                "repo_info": repo_info,
+            }
+            all_results.append(result_data)
+        else:
+            print("\n  --- ❌ No confident match found ---")
+            print(f"  Library Path: {library_path}")
+            print(
+                f"  Best match score was {best_match['score']:.2f}, below the threshold of {threshold}."
+            )
 
     if not found_any:
         print(
@@ -161,8 +306,8 @@ def scan_project_for_vendored_libs(
     if output_file:
         print(f"Saving results to {output_file}...")
         try:
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(all_results, f, indent=2, ensure_ascii=False)
+            with open(output_file, "wb") as f:
+                f.write(orjson.dumps(all_results, option=orjson.OPT_INDENT_2))
             print("Successfully saved results.")
         except IOError as e:
             print(f"Error: Could not write to file {output_file}: {e}")
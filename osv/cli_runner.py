@@ -1,11 +1,51 @@
 import argparse
-import json
+import mmap
 import os
 import subprocess
 import sys
 import shutil
+import tempfile
 from typing import Dict, Any, List, Optional
 
+import orjson
+
+# What osv-scanner prints to stderr when it does not know --output
+OUTPUT_FLAG_REJECTED = b"flag provided but not defined: -output"
+
+
+def _parse_report(output, returncode: int) -> Dict[str, Any]:
+    """
+    Parses an osv-scanner JSON report given as bytes or a memoryview,
+    exiting with a diagnostic if it is empty or not valid JSON.
+    """
+    if not output:
+        print("❌ Error: No output returned from osv-scanner.", file=sys.stderr)
+        if returncode != 0:
+            print(
+                f"⚠️ osv-scanner exited with code {returncode}.",
+                file=sys.stderr,
+            )
+        sys.exit(1)
+
+    try:
+        return orjson.loads(output)
+    except orjson.JSONDecodeError:
+        print(
+            "❌ Error: Failed to parse JSON output from osv-scanner.",
+            file=sys.stderr,
+        )
+        if returncode != 0:
+            print(
+                f"⚠️ osv-scanner exited with code {returncode}.",
+                file=sys.stderr,
+            )
+        head = bytes(output[:65536]).decode("utf-8", errors="replace")
+        preview = head.strip().splitlines()[:10]
+        print("📄 Output preview:", file=sys.stderr)
+        for line in preview:
+            print(line, file=sys.stderr)
+        sys.exit(1)
+
 
 def run_scanner(scanner_path: Optional[str], project_path: str) -> Dict[str, Any]:
     """
@@ -21,43 +61,39 @@ def run_scanner(scanner_path: Optional[str], project_path: str) -> Dict[str, Any
         "--format=json",
         project_path,
     ]
-    print(f"🚀 Executing command: {' '.join(command)}")
 
+    fd, report_path = tempfile.mkstemp(prefix="osv-", suffix=".json")
+    os.close(fd)
     try:
+        # Have osv-scanner write the report to a file itself and map it,
+        # instead of copying all of it through a pipe into Python.
+        # Flags must come before the project path.
+        file_command = command[:-1] + [f"--output={report_path}", project_path]
+        print(f"🚀 Executing command: {' '.join(file_command)}")
         process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            text=True,
+            file_command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
             check=False,
         )
-
-        output = process.stdout.strip()
-        if not output:
-            print("❌ Error: No output returned from osv-scanner.", file=sys.stderr)
-            if process.returncode != 0:
-                print(
-                    f"⚠️ osv-scanner exited with code {process.returncode}.",
-                    file=sys.stderr,
-                )
-            sys.exit(1)
-
-        try:
-            return json.loads(output)
-        except json.JSONDecodeError:
-            print(
-                "❌ Error: Failed to parse JSON output from osv-scanner.",
-                file=sys.stderr,
-            )
-            if process.returncode != 0:
-                print(
-                    f"⚠️ osv-scanner exited with code {process.returncode}.",
-                    file=sys.stderr,
-                )
-            preview = output.splitlines()[:10]
-            print("📄 Output preview:", file=sys.stderr)
-            for line in preview:
-                print(line, file=sys.stderr)
-            sys.exit(1)
+        sys.stderr.buffer.write(process.stderr)
+        sys.stderr.flush()
+
+        if os.path.getsize(report_path) == 0:
+            if process.returncode != 0 and OUTPUT_FLAG_REJECTED in process.stderr:
+                # Releases without --output; run the scan again and read
+                # the report from stdout instead
+                print(f"🚀 Executing command: {' '.join(command)}")
+                with subprocess.Popen(command, stdout=subprocess.PIPE) as process:
+                    output = process.stdout.read()
+                return _parse_report(output.strip(), process.returncode)
+            return _parse_report(b"", process.returncode)
+
+        with open(report_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            with memoryview(mm) as report:
+                return _parse_report(report, process.returncode)
 
     except FileNotFoundError:
         print(f"❌ Error: Command '{command[0]}' not found.", file=sys.stderr)
@@ -69,6 +105,8 @@ def run_scanner(scanner_path: Optional[str], project_path: str) -> Dict[str, Any
     except Exception as e:
         print(f"❌ An unexpected error occurred: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        os.remove(report_path)
 
 
 def process_scan_results(full_results: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -129,8 +167,9 @@ def run_osv_scanner_cli(
     if output_file:
         print(f"💾 Saving processed results to {output_file}...")
         try:
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(processed_results, f, indent=2, ensure_ascii=False)
+            # Serialize in one go and write once; orjson always emits UTF-8
+            with open(output_file, "wb") as f:
+                f.write(orjson.dumps(processed_results, option=orjson.OPT_INDENT_2))
             print("🎉 Successfully saved results.")
         except IOError as e:
             print(
@@ -13,7 +13,6 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 # --- Import project modules ---
 from osv.api_scanner import scan_project_for_vendored_libs
 from tpl.scanner import scanner as TPLScanner
-from tpl.utils.utils import save_js
 from oss.osscollector.OSS_Collector import collect as oss_collect
 from oss.preprocessor.Preprocessor_full import preprocess as oss_preprocess_full
 from oss.preprocessor.Preprocessor_lite import preprocess as oss_preprocess_lite
@@ -30,14 +29,15 @@ def handle_tpl(args):
     if not os.path.isdir(scan_dir):
         print(f"❌ Error: Target directory not found at {scan_dir}", file=sys.stderr)
         sys.exit(1)
-    scanner_obj = TPLScanner(scan_dir)
-    results = scanner_obj.to_dict()
+    scanner_obj = TPLScanner(
+        scan_dir, scan_all=args.scan_all, walk_threads=args.walk_threads
+    )
     output_path = os.path.abspath(args.output)
     output_dir = os.path.dirname(output_path)
     if output_dir and not os.path.isdir(output_dir):
         print(f"❌ Error: Output directory not found at {output_dir}", file=sys.stderr)
         sys.exit(1)
-    save_js(results, output_path)
+    scanner_obj.dump(output_path)
     print(f"\n✅ TPL Scanner analysis complete. Results saved to {output_path}")
 
 
@@ -202,6 +202,17 @@ def main():
         default="results.json",
         help="Path to save the JSON results (default: results.json).",
     )
+    parser_tpl.add_argument(
+        "--scan-all",
+        action="store_true",
+        help="If set, don't skip VCS, node_modules, output and cache directories.",
+    )
+    parser_tpl.add_argument(
+        "--walk-threads",
+        type=int,
+        default=1,
+        help="Threads listing directories concurrently; helps on slow or network disks (default: 1).",
+    )
     parser_tpl.set_defaults(func=handle_tpl)
 
     # --- OSS Subparser ---
@@ -13,7 +13,7 @@ AC_INIT_PATTERN = re.compile(
     re.DOTALL | re.IGNORECASE,
 )
 
-KEY_FILES = ["configure", "configure.in", "configure.ac"]
+KEY_FILES = frozenset(["configure", "configure.in", "configure.ac"])
 
 
 class AutoconfExtractor(Extractor):
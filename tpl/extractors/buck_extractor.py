@@ -1,5 +1,7 @@
 import re
 import logging
+import threading
+from functools import lru_cache
 
 
 from tpl.extractors.extractor import Extractor
@@ -12,13 +14,56 @@ from tpl.dataset.library_dataset.github_data import get_owner_name_from_github_u
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
+BUCK_DEPS_PATTERN = re.compile(r"buckaroo_deps_from_package\s*\(")
+ARG_PATTERN = re.compile(r"\((.*)\)")
+
+# The same dependency URLs and mirrors recur across the BUCK files of a
+# project, so resolve each one only once
+owner_name_from_url = lru_cache(maxsize=4096)(get_owner_name_from_github_url)
+
+
+@lru_cache(maxsize=4096)
+def split_parent(parent):
+    # "owner/name" of the upstream repository of a buckaroo-pm mirror
+    return tuple(parent.split("/")[:2])
+
+
+# Parsed BUCKAROO_REPOS_PARENT, loaded on first use and shared by every
+# BuckExtractor instead of being re-read for each BUCK file
+_buckaroo_parents = None
+_buckaroo_parents_lock = threading.Lock()
+
+
+def get_buckaroo_parents():
+    global _buckaroo_parents
+    if _buckaroo_parents is None:
+        with _buckaroo_parents_lock:
+            if _buckaroo_parents is None:
+                _buckaroo_parents = read_js(BUCKAROO_REPOS_PARENT)
+    return _buckaroo_parents
+
+
+def extract_buck_deps(contents, buckaroo_parents):
+    # Return (owner, name) of every buckaroo_deps_from_package() dependency,
+    # resolving buckaroo-pm mirrors to their upstream repository
+    deps = []
+    for func in get_func_body(BUCK_DEPS_PATTERN, contents):
+        url = ARG_PATTERN.search(func).group(1).partition(",")[0].strip("\"'")
+        owner, dep_name = owner_name_from_url(url)
+        if dep_name in buckaroo_parents:
+            owner, dep_name = split_parent(buckaroo_parents[dep_name])
+        elif owner == "buckaroo-pm":
+            continue
+        deps.append((owner, dep_name))
+    return deps
+
 
 class BuckExtractor(Extractor):
     def __init__(self, target) -> None:
         super().__init__()
         self.target = target
         self.type = "buck"
-        self.buckaroo_parents = read_js(BUCKAROO_REPOS_PARENT)
+        self.buckaroo_parents = get_buckaroo_parents()
 
     def run_extractor(self):
         self.parse_buck()
@@ -27,16 +72,7 @@ class BuckExtractor(Extractor):
 
     def parse_buck(self):
         contents = read_txt(self.target)
-        pattern = "buckaroo_deps_from_package\s*\("
-        funcs = get_func_body(pattern, contents)
-        arg_pattern = "\((.*)\)"
-        for func in funcs:
-            url = re.search(arg_pattern, func).group(1).split(",")[0].strip("\"'")
-            owner, dep_name = get_owner_name_from_github_url(url)
-            if owner == "buckaroo-pm" and dep_name not in self.buckaroo_parents:
-                continue
-            if dep_name in self.buckaroo_parents:
-                owner, dep_name = self.buckaroo_parents[dep_name].split("/")[:2]
+        for owner, dep_name in extract_buck_deps(contents, self.buckaroo_parents):
             dep = Dependency(dep_name, None)
             dep.add_evidence(self.type, self.target, "High")
             self.add_dependency(dep)
@@ -3,7 +3,7 @@ import logging
 
 from tpl.extractors.extractor import Extractor
 from tpl.extractors.dependency import Dependency
-from tpl.utils.utils import read_lines, read_txt
+from tpl.utils.utils import read_txt
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -20,10 +20,9 @@ class Build2Extractor(Extractor):
 
     def parse_build2(self):
         contents = read_txt(self.target)
-        if "build2" not in contents:
+        if contents is None or "build2" not in contents:
             return
-        lines = read_lines(self.target)
-        for line in lines:
+        for line in contents.split("\n"):
             line = line.strip()
             if line.startswith("depends:"):
                 items = line.split(":", 1)[-1]
@@ -11,20 +11,22 @@ logger = logging.getLogger(__name__)
 
 ## Explanation of clib.json / package.json
 ## https://github.com/clibs/clib/wiki/Explanation-of-clib.json
-KEYS = [
-    "name",
-    "version",
-    "src",
-    "dependencies",
-    "development",
-    "repo",
-    "description",
-    "keywords",
-    "license",
-    "makefile",
-    "install",
-    "uninstall",
-]
+KEYS = frozenset(
+    [
+        "name",
+        "version",
+        "src",
+        "dependencies",
+        "development",
+        "repo",
+        "description",
+        "keywords",
+        "license",
+        "makefile",
+        "install",
+        "uninstall",
+    ]
+)
 
 
 class ClibExtractor(Extractor):
@@ -1,6 +1,5 @@
-import json
 import re
-from tpl.utils.utils import remove_lstrip, remove_rstrip
+from tpl.utils.utils import as_dict, remove_lstrip, remove_rstrip
 
 VERSION_SUFFIX_PATTERN = "[._-]?\d+(\.\d+){1,6}([._-]?(snapshot|release|final|alpha|beta|rc$|[a-zA-Z]{1,3}[_-]?\d{1,8}))?$"
 
@@ -38,4 +37,4 @@ class Dependency(object):
         return self.library, self.version
 
     def to_dict(self):
-        return json.loads(json.dumps(self, default=lambda o: o.__dict__))
+        return as_dict(self)
@@ -21,3 +21,29 @@ class Extractor(object):
 
     def to_dict(self):
         return {"deps": self.deps, "type": self.type}
+
+
+class ExtractorResult(object):
+    """Compact record of one extractor run.
+
+    deps and type are shared by every extractor; any other keys its to_dict()
+    returns (e.g. libs and fromfile for cmake) are kept in extra.
+    """
+
+    __slots__ = ("deps", "type", "extra")
+
+    def __init__(self, deps, type, extra=None) -> None:
+        self.deps = deps
+        self.type = type
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, res):
+        extra = {k: v for k, v in res.items() if k not in ("deps", "type")}
+        return cls(res.get("deps", []), res.get("type", ""), extra or None)
+
+    def to_dict(self):
+        res = {"deps": self.deps, "type": self.type}
+        if self.extra:
+            res.update(self.extra)
+        return res
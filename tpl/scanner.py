@@ -1,135 +1,258 @@
 import os
+import importlib
 import logging
-import json
+import mmap
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 
 file_dir = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(os.path.join(file_dir, ".."))
 sys.path.insert(0, os.getcwd())
 import argparse
 
-from tpl.utils.utils import read_txt, save_js
-from tpl.extractors.conan_extractor import ConanExtractor
-from tpl.extractors.control_extractor import ControlExtractor
-from tpl.extractors.cmake_extractor import CmakeExtractor
-from tpl.extractors.autoconf_extractor import AutoconfExtractor
-from tpl.extractors.submodule_extractor import SubmodExtractor
-from tpl.extractors.vcpkg_extractor import VcpkgExtractor
-from tpl.extractors.pkg_extractor import PkgExtractor
-from tpl.extractors.meson_extractor import MesonExtractor
-from tpl.extractors.clib_extractor import ClibExtractor
-from tpl.extractors.bazel_extractor import BazelExtractor
-from tpl.extractors.ms_extractor import MsExtractor
-from tpl.extractors.xmake_extractor import XmakeExtractor
-from tpl.extractors.make_extractor import MakeExtractor
-
-# from tpl.extractors.buckaroo_extractor import BuckarooExtractor
-from tpl.extractors.dds_extractor import DdsExtractor
-
-# from tpl.extractors.buck_extractor import BuckExtractor
-from tpl.extractors.build2_extractor import Build2Extractor
+import orjson
+
+from tpl.utils.utils import as_dict
+from tpl.utils.walk import parallel_walk, walk
+from tpl.extractors.extractor import ExtractorResult
+
+# Extractors as (module, class) specs. load_extractor() imports one the first
+# time a matching file is found, so a scan only loads the parsers (and their
+# dependencies) that the project actually needs.
+CONAN_EXTRACTOR = ("tpl.extractors.conan_extractor", "ConanExtractor")
+CONTROL_EXTRACTOR = ("tpl.extractors.control_extractor", "ControlExtractor")
+CMAKE_EXTRACTOR = ("tpl.extractors.cmake_extractor", "CmakeExtractor")
+AUTOCONF_EXTRACTOR = ("tpl.extractors.autoconf_extractor", "AutoconfExtractor")
+SUBMOD_EXTRACTOR = ("tpl.extractors.submodule_extractor", "SubmodExtractor")
+VCPKG_EXTRACTOR = ("tpl.extractors.vcpkg_extractor", "VcpkgExtractor")
+PKG_EXTRACTOR = ("tpl.extractors.pkg_extractor", "PkgExtractor")
+MESON_EXTRACTOR = ("tpl.extractors.meson_extractor", "MesonExtractor")
+CLIB_EXTRACTOR = ("tpl.extractors.clib_extractor", "ClibExtractor")
+BAZEL_EXTRACTOR = ("tpl.extractors.bazel_extractor", "BazelExtractor")
+MS_EXTRACTOR = ("tpl.extractors.ms_extractor", "MsExtractor")
+XMAKE_EXTRACTOR = ("tpl.extractors.xmake_extractor", "XmakeExtractor")
+MAKE_EXTRACTOR = ("tpl.extractors.make_extractor", "MakeExtractor")
+# BUCKAROO_EXTRACTOR = ("tpl.extractors.buckaroo_extractor", "BuckarooExtractor")
+DDS_EXTRACTOR = ("tpl.extractors.dds_extractor", "DdsExtractor")
+# BUCK_EXTRACTOR = ("tpl.extractors.buck_extractor", "BuckExtractor")
+BUILD2_EXTRACTOR = ("tpl.extractors.build2_extractor", "Build2Extractor")
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-d", type=str, default="", help="set directory to scan")
 parser.add_argument("-t", type=str, default="results.json", help="save results to file")
+parser.add_argument(
+    "--scan-all",
+    action="store_true",
+    help="don't skip VCS, node_modules, output and cache directories",
+)
+parser.add_argument(
+    "--walk-threads",
+    type=int,
+    default=1,
+    help="list directories on this many threads (for slow or network disks)",
+)
 
-CONF_FILES = ["configure", "configure.in", "configure.ac"]
+CONF_FILES = frozenset(["configure", "configure.in", "configure.ac"])
+CONAN_FILES = frozenset(["conanfile.txt", "conaninfo.txt", "conanfile.py"])
+CLIB_FILES = frozenset(["package.json", "clib.json"])
+BAZEL_FILES = frozenset(["bazel.build", "BUILD"])
+# Build files recognized by name: filename -> (extractor, wants_dir).
+# Extractors with wants_dir set are given the directory instead of the file.
+FILE_EXTRACTORS = {
+    "CMakeLists.txt": (CMAKE_EXTRACTOR, False),
+    ".gitmodules": (SUBMOD_EXTRACTOR, True),
+    "vcpkg.json": (VCPKG_EXTRACTOR, False),
+    "meson.build": (MESON_EXTRACTOR, False),
+    "package.json5": (DDS_EXTRACTOR, False),
+    "xmake.lua": (XMAKE_EXTRACTOR, False),
+    # "buckaroo.toml": (BUCKAROO_EXTRACTOR, False),
+    # "BUCK": (BUCK_EXTRACTOR, False),
+}
+FILE_EXTRACTORS.update(dict.fromkeys(CONAN_FILES, (CONAN_EXTRACTOR, False)))
+FILE_EXTRACTORS.update(dict.fromkeys(CLIB_FILES, (CLIB_EXTRACTOR, False)))
+FILE_EXTRACTORS.update(dict.fromkeys(BAZEL_FILES, (BAZEL_EXTRACTOR, False)))
+# Same, matched against the lower-cased filename
+LOWER_FILE_EXTRACTORS = dict.fromkeys(CONF_FILES, (AUTOCONF_EXTRACTOR, False))
+LOWER_FILE_EXTRACTORS["control"] = (CONTROL_EXTRACTOR, False)
+# Only taken when the manifest mentions build2, see scanner.scan()
+LOWER_FILE_EXTRACTORS["manifest"] = (BUILD2_EXTRACTOR, False)
+# Build files recognized by extension, tried when the name matched nothing
+# (keys are the text after the last dot)
+SUFFIX_EXTRACTORS = {
+    "cmake": (CMAKE_EXTRACTOR, False),
+    "pc": (PKG_EXTRACTOR, False),
+    "vcxproj": (MS_EXTRACTOR, False),
+    "vbproj": (MS_EXTRACTOR, False),
+    "props": (MS_EXTRACTOR, False),
+}
+LOWER_SUFFIX_EXTRACTORS = {
+    "dsc": (CONTROL_EXTRACTOR, False),
+}
+# Lower-cased first letters of every name matched above or by the
+# "makefile*" prefix; other files can only match by extension
+NAME_INITIALS = frozenset(
+    name[0].lower()
+    for name in list(FILE_EXTRACTORS) + list(LOWER_FILE_EXTRACTORS) + ["makefile"]
+)
+# Directories not descended into (see skip_dir()) unless scan_all is set: VCS metadata, npm
+# installs (whose package.json files would be taken for clib manifests),
+# bytecode and build/dist outputs, and caches (any name starting with .cache).
+# build/ and vendor/ are deliberately scanned, as they often hold CMake
+# modules and vendored libraries of the project itself.
+SKIP_DIRS = frozenset(
+    [".git", ".hg", ".svn", "node_modules", "__pycache__", "out", "dist"]
+)
+# Below this many matched files, starting worker processes costs more than
+# it saves, so the extractors run on threads instead
+MIN_PROCESS_TASKS = 8
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
 
+def skip_dir(name):
+    return name in SKIP_DIRS or name.startswith(".cache")
+
+
+def mentions_build2(path):
+    """Tell whether the file at path contains "build2".
+
+    Searches the mapped bytes, so the file is never decoded into a string.
+    """
+    try:
+        with open(path, "rb") as f:
+            # Empty files cannot be mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm.find(b"build2") != -1
+    except (OSError, ValueError):
+        return False
+
+
+def json_default(obj):
+    """orjson hook for objects it cannot serialize natively."""
+    if isinstance(obj, ExtractorResult):
+        return obj.to_dict()
+    if isinstance(obj, tuple):
+        return list(obj)
+    if hasattr(obj, "__dict__"):
+        return obj.__dict__
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+@lru_cache(maxsize=None)
+def load_extractor(spec):
+    """Import and return the extractor class of a (module, class) spec."""
+    module, name = spec
+    return getattr(importlib.import_module(module), name)
+
+
+def run_extractor(task):
+    """Run one (extractor, arg) task and return its result, or None on error.
+
+    Kept at module level so it can be sent to worker processes.
+    """
+    extractor, arg = task
+    try:
+        extractor = load_extractor(extractor)(arg)
+        extractor.run_extractor()
+        return ExtractorResult.from_dict(extractor.to_dict())
+    except Exception as e:
+        logger.error(e)
+        return None
+
+
 class scanner(object):
-    def __init__(self, dir_target) -> None:
+    def __init__(self, dir_target, scan_all=False, walk_threads=1) -> None:
         self.target = dir_target
         self.extractors = []
-        self.scan()
+        self.scan(scan_all, walk_threads)
 
-    def scan(self):
-        for root, dirs, filenames in os.walk(self.target):
-            for filename in filenames:
-                extractor = None
+    def scan(self, scan_all=False, walk_threads=1):
+        tasks = []
+        prune = None if scan_all else skip_dir
+        if walk_threads > 1:
+            files = parallel_walk(self.target, prune, walk_threads)
+        else:
+            files = walk(self.target, prune)
+        for root, filename, fullpath in files:
+            ## TODO: readme module
+            # if filename.lower().startswith('readme'):
+            #     extractor = ReadmeExtractor
+            # Most files are sources whose first letter no build file name
+            # starts with; only the extension needs checking for those
+            initial = filename[:1].lower()
+            match = None
+            if initial in NAME_INITIALS:
                 filename_lower = filename.lower()
-                ## TODO: readme module
-                # if filename_lower.startswith('readme'):
-                #     extractor = ReadmeExtractor
-                #     arg = os.path.join(root, filename)
-                if filename_lower == "control" or filename_lower.endswith(".dsc"):
-                    extractor = ControlExtractor
-                    arg = os.path.join(root, filename)
-                elif filename == "CMakeLists.txt" or filename.endswith(".cmake"):
-                    extractor = CmakeExtractor
-                    arg = os.path.join(root, filename)
-                elif filename_lower in CONF_FILES:
-                    extractor = AutoconfExtractor
-                    arg = os.path.join(root, filename)
-                elif filename == ".gitmodules":
-                    extractor = SubmodExtractor
-                    arg = root
-                elif filename == "vcpkg.json":
-                    extractor = VcpkgExtractor
-                    arg = os.path.join(root, filename)
-                elif filename in ["conanfile.txt", "conaninfo.txt", "conanfile.py"]:
-                    extractor = ConanExtractor
-                    arg = os.path.join(root, filename)
-                elif filename.endswith(".pc"):
-                    extractor = PkgExtractor
-                    arg = os.path.join(root, filename)
-                elif filename == "meson.build":
-                    extractor = MesonExtractor
-                    arg = os.path.join(root, filename)
-                elif filename in ["package.json", "clib.json"]:
-                    extractor = ClibExtractor
-                    arg = os.path.join(root, filename)
-                elif filename == "package.json5":
-                    extractor = DdsExtractor
-                    arg = os.path.join(root, filename)
-                elif filename in ["bazel.build", "BUILD"]:
-                    extractor = BazelExtractor
-                    arg = os.path.join(root, filename)
-                elif filename.endswith((".vcxproj", ".vbproj", ".props")):
-                    extractor = MsExtractor
-                    arg = os.path.join(root, filename)
-                elif filename == "xmake.lua":
-                    extractor = XmakeExtractor
-                    arg = os.path.join(root, filename)
-                ## elif filename in ['buckaroo.toml', 'buckaroo.lock.toml', '.buckconfig']:
-                # elif filename in 'buckaroo.toml':
-                #     extractor = BuckarooExtractor
-                #     arg = os.path.join(root, filename)
-                # elif filename == 'BUCK':
-                #     extractor = BuckExtractor
-                #     arg = os.path.join(root, filename)
-                elif filename.lower().startswith("makefile"):
-                    extractor = MakeExtractor
-                    arg = os.path.join(root, filename)
-                elif filename.lower() == "manifest":
-                    file_path = os.path.join(root, filename)
-                    context = read_txt(file_path)
-                    if "build2" not in context:
-                        continue
-                    extractor = Build2Extractor
-                    arg = file_path
-
-                if extractor is None:
-                    continue
-                try:
-                    extractor = extractor(arg)
-                    extractor.run_extractor()
-                    self.extractors.append(extractor.to_dict())
-                except Exception as e:
-                    logger.error(e)
+                match = FILE_EXTRACTORS.get(filename) or LOWER_FILE_EXTRACTORS.get(
+                    filename_lower
+                )
+            if match is None:
+                _, dot, suffix = filename.rpartition(".")
+                if dot:
+                    match = SUFFIX_EXTRACTORS.get(suffix)
+                    if match is None:
+                        match = LOWER_SUFFIX_EXTRACTORS.get(suffix.lower())
+            if (
+                match is None
+                and initial == "m"
+                and filename_lower.startswith("makefile")
+            ):
+                match = (MAKE_EXTRACTOR, False)
+            if match is None:
+                continue
+
+            extractor, wants_dir = match
+            arg = root if wants_dir else fullpath
+            if extractor == BUILD2_EXTRACTOR and not mentions_build2(fullpath):
+                continue
+
+            tasks.append((extractor, arg))
+
+        if not tasks:
+            return
+        # Each extractor parses its own file independently, so run them in
+        # parallel; map() keeps the results in walk order
+        if len(tasks) < MIN_PROCESS_TASKS:
+            executor = ThreadPoolExecutor(max_workers=len(tasks))
+            chunksize = 1
+        else:
+            executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+            chunksize = max(1, len(tasks) // (4 * (os.cpu_count() or 1)))
+        with executor:
+            for res in executor.map(run_extractor, tasks, chunksize=chunksize):
+                if res is not None:
+                    self.extractors.append(res)
 
     def to_dict(self):
-        return json.loads(json.dumps(self, default=lambda o: o.__dict__))
+        return {
+            "target": self.target,
+            "extractors": [as_dict(res.to_dict()) for res in self.extractors],
+        }
+
+    def dump(self, path):
+        """Save the results as JSON to path.
+
+        orjson serializes the scanner directly, so unlike to_dict() no copy
+        of the results is built, and the file is written in one call.
+        """
+        data = orjson.dumps(
+            self,
+            default=json_default,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+        )
+        with open(path, "wb") as save_f:
+            save_f.write(data)
 
 
 def main():
     args = parser.parse_args()
     target = args.d
     save_file = args.t
-    scanner_obj = scanner(target)
-    res = scanner_obj.to_dict()
-    save_js(res, save_file)
+    scanner_obj = scanner(target, args.scan_all, args.walk_threads)
+    scanner_obj.dump(save_file)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import json
 import json5
+import orjson
 import re
 import csv
 import sys
@@ -12,8 +13,24 @@ logger = logging.getLogger(__name__)
 
 
 def save_js(content, path):
-    with open(path, "w") as save_f:
-        json.dump(content, save_f, indent=2, ensure_ascii=False)
+    # Serialize up front and write the whole document in one call, instead
+    # of json.dump's many small writes
+    data = orjson.dumps(content, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    with open(path, "wb") as save_f:
+        save_f.write(data)
+
+
+def as_dict(obj):
+    # Convert objects into nested dicts/lists of their attributes, the same
+    # result as json.loads(json.dumps(obj, default=lambda o: o.__dict__))
+    # without going through a JSON string
+    if isinstance(obj, dict):
+        return {k: as_dict(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [as_dict(v) for v in obj]
+    if hasattr(obj, "__dict__"):
+        return as_dict(obj.__dict__)
+    return obj
 
 
 def add_line(line, path):
@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def list_dir(path, prune=None):
+    """Return the files and subdirectories of one directory.
+
+    Files come as (name, path) pairs, subdirectories as paths. The file type
+    os.scandir already read from each directory entry is reused instead of
+    calling stat(). Symlinked directories are not returned, like os.walk,
+    nor are those for which prune(name) is true. An unreadable directory is
+    treated as empty.
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append((entry.name, entry.path))
+                elif not entry.is_symlink() and not (prune and prune(entry.name)):
+                    subdirs.append(entry.path)
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def walk(top, prune=None):
+    """Yield (root, filename, path) for every file under top, in os.walk order."""
+    stack = [top]
+    while stack:
+        root = stack.pop()
+        files, subdirs = list_dir(root, prune)
+        for name, path in files:
+            yield root, name, path
+        stack.extend(reversed(subdirs))
+
+
+def parallel_walk(top, prune=None, workers=8):
+    """Same as walk(), but list directories concurrently on a thread pool.
+
+    The directories on top of the stack, which are walked next, are listed
+    ahead of time, so several readdir calls are in flight at once while
+    files are yielded, still in os.walk order. At most workers * 4 listings
+    are pending or waiting to be consumed, so memory stays bounded on wide
+    trees. This pays off when directory reads wait on the disk or a network
+    filesystem; on a tree already in the page cache the serial walk() is
+    faster.
+    """
+    read_ahead = workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        listings = {}
+        stack = [top]
+        while stack:
+            for path in reversed(stack):
+                if len(listings) >= read_ahead:
+                    break
+                if path not in listings:
+                    listings[path] = executor.submit(list_dir, path, prune)
+            root = stack.pop()
+            # Listings scheduled earlier may use up the budget before the
+            # next directory gets one; list it here then
+            listing = listings.pop(root, None)
+            files, subdirs = listing.result() if listing else list_dir(root, prune)
+            for name, path in files:
+                yield root, name, path
+            stack.extend(reversed(subdirs))